@@ -0,0 +1,200 @@
+import gzip
+import json
+import os
+import threading
+import time
+from datetime import date, timedelta
+from app.database import supabase, iter_table_chunks
+from app.rollups import get_watermark
+
+# must be an absolute path on a volume shared by every replica and kept across deploys;
+# archived rows are deleted from the database, so this is their only copy
+ARCHIVE_DIR = os.environ.get("ARCHIVE_DIR")
+HOT_RETENTION_DAYS = int(os.environ.get("HOT_RETENTION_DAYS", 180))
+ARCHIVE_BUCKETS = int(os.environ.get("ARCHIVE_BUCKETS", 64))
+BANK_ACCOUNT = 0
+MANIFEST_FILE = "manifest.json"
+
+_archive_lock = threading.Lock()
+
+
+def archive_configured():
+    return bool(ARCHIVE_DIR) and os.path.isabs(ARCHIVE_DIR)
+
+
+def _manifest_path():
+    return os.path.join(ARCHIVE_DIR, MANIFEST_FILE)
+
+
+def _empty_manifest():
+    return {"archived_before": None, "latest_archived": None, "buckets": ARCHIVE_BUCKETS, "segments": {}}
+
+
+def load_manifest():
+    if not archive_configured():
+        return _empty_manifest()
+    try:
+        with open(_manifest_path()) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return _empty_manifest()
+
+
+def _save_manifest(manifest):
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
+    tmp = _manifest_path() + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, _manifest_path())
+
+
+def _segment_key(month, bucket):
+    return f"{month}/{bucket:03d}"
+
+
+def _segment_ids(path):
+    try:
+        with gzip.open(path, "rt") as f:
+            return {json.loads(line)["id"] for line in f}
+    except FileNotFoundError:
+        return set()
+
+
+def _append_segment(manifest, segment_ids, month, bucket, rows):
+    key = _segment_key(month, bucket)
+    segment = manifest["segments"].setdefault(key, {
+        "file": f"transactions-{month}-{bucket:03d}.jsonl.gz",
+        "count": 0
+    })
+    path = os.path.join(ARCHIVE_DIR, segment["file"])
+    # ids already on disk are skipped, so rows re-read after a crash before their delete are not written twice
+    ids = segment_ids.get(key)
+    if ids is None:
+        ids = segment_ids[key] = _segment_ids(path)
+    latest = max(str(row["created_at"])[:10] for row in rows)
+    manifest["latest_archived"] = max(manifest.get("latest_archived") or "", latest)
+    rows = [row for row in rows if row["id"] not in ids]
+    segment["count"] = len(ids) + len(rows)
+    if not rows:
+        return
+
+    # each append is a new gzip member; readers see one continuous stream
+    with gzip.open(path, "at") as f:
+        for row in rows:
+            f.write(json.dumps(row) + "\n")
+    with open(path, "rb") as f:
+        os.fsync(f.fileno())
+    ids.update(row["id"] for row in rows)
+
+
+def archive_transactions(before: date = None, chunk_size=1000):
+    if not archive_configured():
+        raise RuntimeError("ARCHIVE_DIR must be set to an absolute path on a shared, persistent volume before archiving")
+    before = before or date.today() - timedelta(days=HOT_RETENTION_DAYS)
+    if not _archive_lock.acquire(blocking=False):
+        return {"status": "already_running"}
+
+    try:
+        os.makedirs(ARCHIVE_DIR, exist_ok=True)
+        manifest = load_manifest()
+        # rows the analytics rollups have not consumed yet stay in hot storage
+        rolled_up_until = str(get_watermark()["last_created_at"] or "-infinity")
+        cutoff = min(before.isoformat(), rolled_up_until)
+        started = time.perf_counter()
+        archived = 0
+        segment_ids = {}
+
+        for rows in iter_table_chunks(
+            "transaction",
+            "*",
+            chunk_size=chunk_size,
+            filters=(("lt", "created_at", cutoff),)
+        ):
+            # segments are split by month and by account bucket; a transfer lands in both parties' buckets
+            segments = {}
+            buckets = manifest["buckets"]
+            for row in rows:
+                month = str(row["created_at"])[:7]
+                for bucket in {a % buckets for a in (row["from_account"], row["to_account"]) if a != BANK_ACCOUNT}:
+                    segments.setdefault((month, bucket), []).append(row)
+            for (month, bucket), segment_rows in segments.items():
+                _append_segment(manifest, segment_ids, month, bucket, segment_rows)
+            _save_manifest(manifest)
+
+            # rows leave hot storage only after their segments and the manifest are fsynced
+            supabase.table("transaction").delete().in_("id", [row["id"] for row in rows]).execute()
+            archived += len(rows)
+
+        fully_archived = not supabase.table("transaction") \
+            .select("id") \
+            .lt("created_at", before.isoformat()) \
+            .limit(1) \
+            .execute().data
+        if fully_archived and (manifest["archived_before"] or "") < before.isoformat():
+            manifest["archived_before"] = before.isoformat()
+        _save_manifest(manifest)
+
+        return {
+            "status": "success",
+            "archived_before": manifest["archived_before"],
+            "latest_archived": manifest["latest_archived"],
+            "transactions_archived": archived,
+            "elapsed_seconds": round(time.perf_counter() - started, 3)
+        }
+    finally:
+        _archive_lock.release()
+
+
+def _months(start: date, end: date):
+    month = date(start.year, start.month, 1)
+    while month <= end:
+        yield month.strftime("%Y-%m")
+        month = date(month.year + month.month // 12, month.month % 12 + 1, 1)
+
+
+def read_archived(manifest, account_id: int, start: date, end: date):
+    bucket = account_id % manifest["buckets"]
+    rows = []
+    for month in _months(start, end):
+        segment = manifest["segments"].get(_segment_key(month, bucket))
+        if not segment:
+            continue
+        with gzip.open(os.path.join(ARCHIVE_DIR, segment["file"]), "rt") as f:
+            for line in f:
+                row = json.loads(line)
+                if account_id not in (row["from_account"], row["to_account"]):
+                    continue
+                if start.isoformat() <= str(row["created_at"])[:10] <= end.isoformat():
+                    rows.append(row)
+    return rows
+
+
+def fetch_account_transactions(account_id: int, start_date: date = None, end_date: date = None):
+    query = supabase.table("transaction") \
+        .select("*") \
+        .or_(f"from_account.eq.{account_id},to_account.eq.{account_id}")
+    if start_date:
+        query = query.gte("created_at", start_date.isoformat())
+    if end_date:
+        query = query.lt("created_at", (end_date + timedelta(days=1)).isoformat())
+    rows = query.order("created_at", desc=True).execute().data
+
+    # with no date range the statement is served from hot storage only
+    manifest = load_manifest()
+    latest_archived = manifest.get("latest_archived")
+    reaches_archive = latest_archived and (start_date is None or start_date.isoformat() <= latest_archived)
+    if (start_date or end_date) and reaches_archive:
+        archive_start = start_date or date.fromisoformat(min(manifest["segments"])[:7] + "-01")
+        archive_end = date.fromisoformat(latest_archived)
+        if end_date and end_date < archive_end:
+            archive_end = end_date
+        seen = {row["id"] for row in rows}
+        for row in read_archived(manifest, account_id, archive_start, archive_end):
+            if row["id"] not in seen:
+                seen.add(row["id"])
+                rows.append(row)
+        rows.sort(key=lambda row: str(row["created_at"]), reverse=True)
+
+    return rows
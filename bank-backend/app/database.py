@@ -5,3 +5,21 @@ supabase_url = os.environ.get("SUPABASE_URL")
 supabase_key = os.environ.get("SUPABASE_KEY")
 
 supabase = create_client(supabase_url, supabase_key)
+
+# PostgREST caps every response at its db-max-rows setting (1000 on Supabase)
+MAX_ROWS = int(os.environ.get("SUPABASE_MAX_ROWS", 1000))
+
+
+def iter_table_chunks(table, columns="*", key="id", chunk_size=1000, after=None, filters=()):
+    chunk_size = min(chunk_size, MAX_ROWS)
+    while True:
+        query = supabase.table(table).select(columns).order(key).limit(chunk_size)
+        for method, column, value in filters:
+            query = getattr(query, method)(column, value)
+        if after is not None:
+            query = query.gt(key, after)
+        rows = query.execute().data
+        if not rows:
+            return
+        yield rows
+        after = rows[-1][key]
@@ -0,0 +1,63 @@
+import base64
+import csv
+import io
+import json
+import os
+from app.database import iter_table_chunks, MAX_ROWS
+
+EXPORT_CHUNK_SIZE = min(int(os.environ.get("EXPORT_CHUNK_SIZE", MAX_ROWS)), MAX_ROWS)
+
+# table -> primary key used for ordered, ranged reads
+EXPORT_TABLES = {
+    "customer": "id",
+    "employee": "employee_id",
+    "account": "id",
+}
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv",
+}
+
+
+def encode_resume_token(table, after):
+    return base64.urlsafe_b64encode(json.dumps({"table": table, "after": after}).encode()).decode()
+
+
+def decode_resume_token(table, token):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(token.encode()))
+    except (ValueError, TypeError):
+        raise ValueError("Malformed resume token")
+    if not isinstance(payload, dict) or not isinstance(payload.get("after"), (int, str)) or isinstance(payload["after"], bool):
+        raise ValueError("Malformed resume token")
+    if payload.get("table") != table:
+        raise ValueError(f"Resume token belongs to table {payload.get('table')}")
+    return payload["after"]
+
+
+def _ndjson_chunks(table, key, chunks):
+    for rows in chunks:
+        yield "".join(json.dumps(row, default=str) + "\n" for row in rows)
+        yield json.dumps({"_resume_token": encode_resume_token(table, rows[-1][key])}) + "\n"
+
+
+def _csv_chunks(table, key, chunks):
+    # every row carries the token that resumes the export right after it
+    fieldnames = None
+    for rows in chunks:
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=fieldnames or list(rows[0]) + ["_resume_token"], extrasaction="ignore")
+        if fieldnames is None:
+            fieldnames = writer.fieldnames
+            writer.writeheader()
+        writer.writerows({**row, "_resume_token": encode_resume_token(table, row[key])} for row in rows)
+        yield buffer.getvalue()
+
+
+def export_table(table, fmt, chunk_size=EXPORT_CHUNK_SIZE, after=None):
+    key = EXPORT_TABLES[table]
+    chunks = iter_table_chunks(table, "*", key=key, chunk_size=chunk_size, after=after)
+    if fmt == "ndjson":
+        return _ndjson_chunks(table, key, chunks)
+    return _csv_chunks(table, key, chunks)
@@ -0,0 +1,89 @@
+import asyncio
+import os
+import time
+from datetime import datetime
+from anyio.to_thread import current_default_thread_limiter
+from app.database import supabase
+
+PROBE_INTERVAL_SECONDS = float(os.environ.get("HEALTH_PROBE_INTERVAL_SECONDS", 5))
+PROBE_TIMEOUT_SECONDS = float(os.environ.get("HEALTH_PROBE_TIMEOUT_SECONDS", 2))
+MAX_DB_LATENCY_MS = float(os.environ.get("HEALTH_MAX_DB_LATENCY_MS", 1000))
+MAX_POOL_SATURATION = float(os.environ.get("HEALTH_MAX_POOL_SATURATION", 0.9))
+
+
+def _probe_database():
+    supabase.table("account").select("id").limit(1).execute()
+
+
+class HealthMonitor:
+    def __init__(self):
+        self.state = None
+        self._task = None
+
+    async def probe(self):
+        limiter = current_default_thread_limiter()
+        pool = {
+            "in_use": limiter.borrowed_tokens,
+            "size": limiter.total_tokens,
+            "saturation": round(limiter.borrowed_tokens / limiter.total_tokens, 3)
+        }
+
+        started = time.perf_counter()
+        try:
+            await asyncio.wait_for(asyncio.to_thread(_probe_database), PROBE_TIMEOUT_SECONDS)
+            database = {"ok": True, "latency_ms": round((time.perf_counter() - started) * 1000, 1)}
+        except asyncio.TimeoutError:
+            database = {"ok": False, "error": f"probe timed out after {PROBE_TIMEOUT_SECONDS}s"}
+        except Exception as e:
+            database = {"ok": False, "error": str(e)}
+
+        self.state = {
+            "checked_at": datetime.now().isoformat(),
+            "checked_monotonic": time.monotonic(),
+            "database": database,
+            "pool": pool
+        }
+
+    async def _run(self):
+        while True:
+            await self.probe()
+            await asyncio.sleep(PROBE_INTERVAL_SECONDS)
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    def readiness(self):
+        state = self.state
+        if state is None:
+            return False, {"status": "starting", "reasons": ["no probe has completed yet"]}
+
+        reasons = []
+        age = time.monotonic() - state["checked_monotonic"]
+        if age > PROBE_INTERVAL_SECONDS * 3 + PROBE_TIMEOUT_SECONDS:
+            reasons.append(f"last probe is stale ({age:.1f}s old)")
+        if not state["database"]["ok"]:
+            reasons.append(f"database unreachable: {state['database']['error']}")
+        elif state["database"]["latency_ms"] > MAX_DB_LATENCY_MS:
+            reasons.append(f"database latency {state['database']['latency_ms']}ms over {MAX_DB_LATENCY_MS}ms")
+        if state["pool"]["saturation"] > MAX_POOL_SATURATION:
+            reasons.append(f"worker pool saturation {state['pool']['saturation']} over {MAX_POOL_SATURATION}")
+
+        return not reasons, {
+            "status": "degraded" if reasons else "ready",
+            "reasons": reasons,
+            "checked_at": state["checked_at"],
+            "probe_age_seconds": round(age, 1),
+            "database": state["database"],
+            "pool": state["pool"]
+        }
+
+
+health_monitor = HealthMonitor()
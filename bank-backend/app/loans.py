@@ -0,0 +1,183 @@
+import numpy as np
+from datetime import date
+
+DAYS_IN_YEAR = 365
+MONTHS_IN_YEAR = 12
+
+LOAN_COLUMNS = "id, account_id, loan_type_id, amount, amount_paid, start_date, due_date, accrued_interest, last_accrued_on"
+
+
+def _to_days(values):
+    return np.array([v[:10] if v else "NaT" for v in values], dtype="datetime64[D]")
+
+
+def _to_floats(values):
+    return np.array([v or 0.0 for v in values], dtype=np.float64)
+
+
+def _column(rows, field):
+    return [r[field] for r in rows]
+
+
+def months_between(start: date, due: date) -> int:
+    return max((due.year - start.year) * MONTHS_IN_YEAR + due.month - start.month, 1)
+
+
+def loan_batch_from_rows(rows, rates_by_type: dict):
+    loan_type_ids = _column(rows, "loan_type_id")
+    return {
+        "id": np.array(_column(rows, "id"), dtype=np.int64),
+        "loan_type_id": np.array(loan_type_ids, dtype=np.int64),
+        "principal": _to_floats(_column(rows, "amount")),
+        "amount_paid": _to_floats(_column(rows, "amount_paid")),
+        "accrued_interest": _to_floats(_column(rows, "accrued_interest")),
+        "annual_rate": _to_floats([rates_by_type.get(t) for t in loan_type_ids]),
+        "start_date": _to_days(_column(rows, "start_date")),
+        "due_date": _to_days(_column(rows, "due_date")),
+        "last_accrued_on": _to_days(_column(rows, "last_accrued_on")),
+    }
+
+
+def level_payment(principal, monthly_rate, periods):
+    with np.errstate(divide="ignore", invalid="ignore"):
+        amortised = principal * monthly_rate / (1 - (1 + monthly_rate) ** -periods)
+    return np.where(monthly_rate > 0, amortised, principal / periods)
+
+
+def balance_after_payments(principal, monthly_rate, periods, amount_paid):
+    # amount_paid is the cumulative cash paid against the installment plan, interest included:
+    # whole installments retire their scheduled principal, a partial one covers interest first
+    principal, monthly_rate, amount_paid = np.broadcast_arrays(*(np.asarray(v, dtype=np.float64) for v in (principal, monthly_rate, amount_paid)))
+    payment = level_payment(principal, monthly_rate, periods)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        installments = np.where(payment > 0, np.floor((amount_paid + 0.005) / payment), periods)
+    installments = np.minimum(installments, periods)
+    growth = (1 + monthly_rate) ** installments
+    with np.errstate(divide="ignore", invalid="ignore"):
+        balance = np.where(
+            monthly_rate > 0,
+            principal * growth - payment * (growth - 1) / monthly_rate,
+            principal - payment * installments
+        )
+    balance = np.maximum(balance, 0.0)
+    remainder = np.maximum(amount_paid - installments * payment, 0.0)
+    balance = np.maximum(balance - np.maximum(remainder - balance * monthly_rate, 0.0), 0.0)
+    return np.where(installments >= periods, 0.0, balance), installments
+
+
+def loan_periods(batch):
+    months = (batch["due_date"].astype("datetime64[M]") - batch["start_date"].astype("datetime64[M]")).astype(np.float64)
+    return np.maximum(np.nan_to_num(months, nan=1.0), 1.0)
+
+
+def outstanding_principal(batch):
+    balance, _ = balance_after_payments(
+        batch["principal"],
+        batch["annual_rate"] / 100 / MONTHS_IN_YEAR,
+        loan_periods(batch),
+        batch["amount_paid"]
+    )
+    return balance
+
+
+def daily_interest(batch):
+    return outstanding_principal(batch) * batch["annual_rate"] / 100 / DAYS_IN_YEAR
+
+
+def accrue_interest(batch, as_of: date):
+    as_of = np.datetime64(as_of, "D")
+    accrue_from = np.where(np.isnat(batch["last_accrued_on"]), batch["start_date"], batch["last_accrued_on"])
+    days = np.nan_to_num((as_of - accrue_from) / np.timedelta64(1, "D"), nan=0.0)
+    days = np.clip(days, 0, None)
+    interest = daily_interest(batch) * days
+    return interest, days
+
+
+def accrual_payload(batch, as_of: date):
+    interest, days = accrue_interest(batch, as_of)
+    changed = days > 0
+    # the last_accrued_on each delta was computed from; the database applies a delta only if it still matches
+    accrued_from = batch["last_accrued_on"][changed].astype(str)
+    return {
+        "p_as_of": as_of.isoformat(),
+        "p_ids": batch["id"][changed].tolist(),
+        "p_from": [None if d == "NaT" else d for d in accrued_from.tolist()],
+        "p_interest": interest[changed].round(6).tolist(),
+    }
+
+
+def portfolio_totals(batch, as_of: date):
+    as_of = np.datetime64(as_of, "D")
+    outstanding = outstanding_principal(batch)
+    overdue = (batch["due_date"] < as_of) & (outstanding > 0)
+    interest, _ = accrue_interest(batch, as_of)
+    return {
+        "loan_count": int(batch["id"].size),
+        "active_count": int(np.count_nonzero(outstanding > 0)),
+        "total_principal": float(batch["principal"].sum()),
+        "total_paid": float(batch["amount_paid"].sum()),
+        "total_outstanding": float(outstanding.sum()),
+        "accrued_interest": float((batch["accrued_interest"] + interest).sum()),
+        "daily_interest": float(daily_interest(batch).sum()),
+        "rate_weighted_outstanding": float((outstanding * batch["annual_rate"]).sum()),
+        "overdue_count": int(np.count_nonzero(overdue)),
+        "overdue_outstanding": float(outstanding[overdue].sum()),
+    }
+
+
+def merge_totals(total: dict, chunk: dict):
+    for field, value in chunk.items():
+        total[field] = total.get(field, 0) + value
+    return total
+
+
+def summarise_portfolio(totals: dict):
+    outstanding = totals.get("total_outstanding", 0.0)
+    summary = {field: round(value, 2) if isinstance(value, float) else value
+               for field, value in totals.items() if field != "rate_weighted_outstanding"}
+    summary["weighted_interest_rate"] = round(totals.get("rate_weighted_outstanding", 0.0) / outstanding, 4) if outstanding else 0.0
+    return summary
+
+
+def amortisation_schedule(principal: float, annual_rate: float, start: date, due: date, amount_paid: float = 0.0, as_of: date = None):
+    as_of = as_of or date.today()
+    periods = months_between(start, due)
+    rate = annual_rate / 100 / MONTHS_IN_YEAR
+    k = np.arange(1, periods + 1)
+    payment = float(level_payment(np.float64(principal), np.float64(rate), periods))
+
+    if rate == 0:
+        closing = principal - payment * k
+    else:
+        growth = (1 + rate) ** k
+        closing = principal * growth - payment * (growth - 1) / rate
+    closing = np.maximum(closing, 0.0)
+    closing[-1] = 0.0
+
+    opening = np.concatenate(([principal], closing[:-1]))
+    interest = opening * rate
+    principal_part = opening - closing
+    payments = principal_part + interest
+
+    months = np.datetime64(start, "M") + k
+    month_start = months.astype("datetime64[D]")
+    month_end = (months + 1).astype("datetime64[D]") - 1
+    due_dates = np.minimum(month_start + (start.day - 1), month_end)
+
+    _, installments = balance_after_payments(principal, rate, periods, amount_paid)
+    paid = k <= installments
+    overdue = ~paid & (due_dates < np.datetime64(as_of, "D"))
+
+    return [
+        {
+            "period": int(k[i]),
+            "due_date": str(due_dates[i]),
+            "opening_balance": round(float(opening[i]), 2),
+            "payment": round(float(payments[i]), 2),
+            "interest": round(float(interest[i]), 2),
+            "principal": round(float(principal_part[i]), 2),
+            "closing_balance": round(float(closing[i]), 2),
+            "status": "paid" if paid[i] else "overdue" if overdue[i] else "due",
+        }
+        for i in range(periods)
+    ]
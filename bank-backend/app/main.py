@@ -1,12 +1,24 @@
-from fastapi import FastAPI, HTTPException, Depends, status, Request , Body
+from fastapi import FastAPI, HTTPException, Depends, status, Request , Body , Query
 from fastapi.security import APIKeyHeader , OAuth2PasswordBearer
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-from datetime import datetime, timedelta
-from app.database import supabase
-from app.models import Transaction, LoanApplication , UserLogin , Token , DepositRequest, WithdrawalRequest , CustomerCreate , EmployeeCreate , EmployeeLogin , AdminLogin
+from datetime import datetime, timedelta, date
+from typing import Optional
+from app.database import supabase, iter_table_chunks, MAX_ROWS
+from app.models import Transaction, LoanApplication , UserLogin , Token , DepositRequest, WithdrawalRequest , CustomerCreate , EmployeeCreate , EmployeeLogin , AdminLogin , PostingRunRequest
+from app.loans import LOAN_COLUMNS, loan_batch_from_rows, outstanding_principal, accrual_payload, portfolio_totals, merge_totals, summarise_portfolio, amortisation_schedule
+from app.postings import run_postings, get_run
+from app.risk import velocity, warm_load
+from app.health import health_monitor
+from app.archive import archive_configured, archive_transactions, fetch_account_transactions, load_manifest
+from app.singleflight import read_flight
+from app.exports import EXPORT_CHUNK_SIZE, EXPORT_TABLES, MEDIA_TYPES, export_table, decode_resume_token
+from app.rollups import ACCOUNT_ROLLUP, BANK_ROLLUP, ACCOUNT_METRICS, refresh_rollups, fetch_rollups, top_accounts, get_watermark
 from jose import jwt, JWTError
+import asyncio
+import numpy as np
 import os
+import time
 
 required_vars = ["SUPABASE_URL", "SUPABASE_KEY", "JWT_SECRET"]
 for var in required_vars:
@@ -26,6 +38,8 @@ oauth2_scheme = OAuth2PasswordBearer(tokenUrl="auth/login")
 SECRET_KEY = os.environ.get("JWT_SECRET")
 ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = int(os.environ.get("JWT_EXPIRE_MINUTES", 60))
+LOAN_CHUNK_SIZE = int(os.environ.get("LOAN_CHUNK_SIZE", 1000))
+ANALYTICS_DEFAULT_DAYS = int(os.environ.get("ANALYTICS_DEFAULT_DAYS", 30))
 
 
 app.add_middleware(
@@ -43,6 +57,25 @@ API_KEY = "your-secret-key"
 api_key_header = APIKeyHeader(name="X-API-Key")
 
 
+@app.on_event("startup")
+def warm_velocity_tracker():
+    try:
+        loaded = warm_load(velocity)
+        print(f"Velocity tracker warmed with {loaded} transactions")
+    except Exception as e:
+        print(f"Velocity warm-load error: {str(e)}")
+
+
+def enforce_velocity(account_id: int, amount: float, receiver: int):
+    risk = velocity.reserve(account_id, amount, receiver)
+    if risk["action"] == "block":
+        raise HTTPException(403, detail={
+            "error": "transaction_blocked",
+            "reasons": risk["reasons"]
+        })
+    return risk
+
+
 @app.exception_handler(Exception)
 async def global_exception_handler(request: Request, exc: Exception):
     return JSONResponse(
@@ -67,10 +100,17 @@ async def get_current_user(token: str = Depends(oauth2_scheme)):
     except Exception as e:
         raise HTTPException(401, detail=f"Invalid token: {str(e)}")
     
+def statement_period(start_date: Optional[date], end_date: Optional[date]):
+    if start_date or end_date:
+        return f"{start_date or 'Beginning'} to {end_date or 'Today'}"
+    latest_archived = load_manifest().get("latest_archived")
+    return f"Transactions after {latest_archived}" if latest_archived else "All transactions"
+
 @app.get("/admin/accounts/{account_id}/statement")
 async def get_account_statement_admin(
     account_id: int,
-    
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None
 ):
 
     try:
@@ -85,11 +125,7 @@ async def get_account_statement_admin(
             raise HTTPException(404, "Account not found")
         
  
-        transactions = supabase.table("transaction") \
-            .select("*") \
-            .or_(f"from_account.eq.{account_id},to_account.eq.{account_id}") \
-            .order("created_at", desc=True) \
-            .execute()
+        transactions = await asyncio.to_thread(fetch_account_transactions, account_id, start_date, end_date)
 
     
         customer = supabase.table("customer") \
@@ -103,8 +139,9 @@ async def get_account_statement_admin(
             "customer_id": account.data[0]["customer_id"],
             "customer_name": f"{customer.data[0]['first_name']} {customer.data[0]['last_name']}",
             "current_balance": account.data[0]["balance"],
-            "transaction_count": len(transactions.data),
-            "transactions": transactions.data 
+            "period": statement_period(start_date, end_date),
+            "transaction_count": len(transactions),
+            "transactions": transactions
         }
 
     except HTTPException:
@@ -112,10 +149,18 @@ async def get_account_statement_admin(
     except Exception as e:
         raise HTTPException(500, detail=str(e))
 
+def fetch_account_balance(account_id: int):
+    return read_flight.do(
+        f"account_balance:{account_id}",
+        lambda: supabase.table("account").select(
+            "balance, card(is_blocked), customer(first_name, last_name)"
+        ).eq("id", account_id).execute()
+    )
+
 @app.get("/admin/accounts/{account_id}/balance")
 def get_balance(account_id: int):
 
-    account = supabase.table("account").select( "balance, card(is_blocked), customer(first_name, last_name)" ).eq("id", account_id).execute()
+    account = fetch_account_balance(account_id)
     if not account.data:
         raise HTTPException(404, "Account not found")
     return {
@@ -124,6 +169,27 @@ def get_balance(account_id: int):
     "customer_name": f"{account.data[0]['customer']['first_name']} {account.data[0]['customer']['last_name']}"
     }
 
+@app.get("/admin/accounts/{account_id}/velocity")
+def get_account_velocity(
+    account_id: int,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] not in ["admin", "employee"]:
+        raise HTTPException(403, "Unauthorized access")
+
+    return {
+        "account_id": account_id,
+        "windows": velocity.snapshot(account_id),
+        "tracked_accounts": velocity.tracked_accounts()
+    }
+
+@app.get("/admin/metrics/singleflight")
+def get_singleflight_metrics(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(403, "Only admin can view metrics")
+
+    return read_flight.stats()
+
 @app.get("/accounts/balance")
 def get_alance(current_user: dict = Depends(get_current_user)):
 
@@ -132,9 +198,7 @@ def get_alance(current_user: dict = Depends(get_current_user)):
     if not account_id:
         raise HTTPException(403, "No linked account found")
     
-    account = supabase.table("account").select(
-        "balance, card(is_blocked), customer(first_name, last_name)"
-    ).eq("id", account_id).execute()
+    account = fetch_account_balance(account_id)
     
     if not account.data:
         raise HTTPException(404, "Account not found")
@@ -153,6 +217,7 @@ async def withdraw_funds(
     current_user: dict = Depends(get_current_user),
 ):
     
+    risk = None
     try:
         
         account_id = current_user.get("linked_customer_id")
@@ -172,6 +237,8 @@ async def withdraw_funds(
         current_balance = float(account.data[0]["balance"])
         if current_balance < withdrawal.amount:
             raise HTTPException(400, "Insufficient funds")
+
+        risk = enforce_velocity(account_id, withdrawal.amount, 0)
         
         
         new_balance = current_balance - withdrawal.amount
@@ -192,12 +259,15 @@ async def withdraw_funds(
         return {
             "status": "success",
             "new_balance": new_balance,
-            "transaction_id": transaction_record.data[0]["id"]
+            "transaction_id": transaction_record.data[0]["id"],
+            "risk_flags": risk["reasons"]
         }
     
     except HTTPException:
         raise
     except Exception as e:
+        if risk:
+            velocity.release(risk["reservation"])
         raise HTTPException(500, detail=str(e))
             
                 
@@ -248,6 +318,7 @@ async def transfer_funds(
     transaction: Transaction,  
     current_user: dict = Depends(get_current_user)
 ):
+    risk = None
     try:
  
         from_account = current_user.get("linked_customer_id")
@@ -279,6 +350,8 @@ async def transfer_funds(
         if sender_balance < transaction.amount:
             raise HTTPException(400, "Insufficient funds")
 
+        risk = enforce_velocity(from_account, transaction.amount, transaction.to_account)
+
     
         new_sender_balance = sender_balance - transaction.amount
         new_receiver_balance = float(receiver_account.data[0]["balance"]) + transaction.amount
@@ -309,12 +382,15 @@ async def transfer_funds(
         return {
             "status": "success",
             "new_balance": new_sender_balance,
-            "transaction_id": transaction_record.data[0]["id"]
+            "transaction_id": transaction_record.data[0]["id"],
+            "risk_flags": risk["reasons"]
         }
 
     except HTTPException as he:
         raise he
     except Exception as e:
+        if risk:
+            velocity.release(risk["reservation"])
         raise HTTPException(500, detail={
             "error": "transfer_failed",
             "message": str(e)
@@ -339,6 +415,7 @@ def apply_loan(application: LoanApplication):
             "loan_type_id": application.loan_type_id,
             "start_date": datetime.now().date().isoformat(),
             "due_date": application.due_date.isoformat() if hasattr(application.due_date, 'isoformat') else application.due_date,
+            "amount": application.amount,
             "amount_paid": application.amount_paid or 0.0
         }
         
@@ -362,6 +439,272 @@ def apply_loan(application: LoanApplication):
             "message": str(e)
         })
 
+def get_loan_rates():
+    loan_types = supabase.table("loan_type").select("id, base_interest_rate").execute()
+    return {lt["id"]: float(lt["base_interest_rate"] or 0.0) for lt in loan_types.data}
+
+
+@app.get("/loans/{loan_id}/schedule", tags=["Loans"])
+def get_loan_schedule(
+    loan_id: int,
+    current_user: dict = Depends(get_current_user)
+):
+    loan = supabase.table("loan").select(LOAN_COLUMNS).eq("id", loan_id).execute()
+    if not loan.data:
+        raise HTTPException(404, detail={"error": "loan_not_found", "loan_id": loan_id})
+    loan = loan.data[0]
+
+    if current_user["role"] not in ["admin", "employee"] and loan["account_id"] != current_user.get("linked_customer_id"):
+        raise HTTPException(403, "Unauthorized access")
+
+    if not loan.get("amount"):
+        raise HTTPException(400, detail={"error": "loan_principal_missing", "loan_id": loan_id})
+
+    rates = get_loan_rates()
+    annual_rate = rates.get(loan["loan_type_id"], 0.0)
+    schedule = amortisation_schedule(
+        principal=float(loan["amount"]),
+        annual_rate=annual_rate,
+        start=date.fromisoformat(str(loan["start_date"])[:10]),
+        due=date.fromisoformat(str(loan["due_date"])[:10]),
+        amount_paid=float(loan.get("amount_paid") or 0.0)
+    )
+
+    return {
+        "loan_id": loan_id,
+        "account_id": loan["account_id"],
+        "principal": loan["amount"],
+        "interest_rate": annual_rate,
+        "amount_paid": loan.get("amount_paid") or 0.0,
+        "outstanding_principal": round(float(outstanding_principal(loan_batch_from_rows([loan], rates))[0]), 2),
+        "accrued_interest": loan.get("accrued_interest") or 0.0,
+        "period_count": len(schedule),
+        "schedule": schedule
+    }
+
+
+@app.get("/admin/loans/portfolio", tags=["Loans"])
+def get_loan_portfolio(
+    as_of: Optional[date] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] not in ["admin", "employee"]:
+        raise HTTPException(403, "Unauthorized access")
+
+    as_of = as_of or date.today()
+    rates = get_loan_rates()
+    totals = {}
+    by_type = {}
+
+    for rows in iter_table_chunks("loan", LOAN_COLUMNS, chunk_size=LOAN_CHUNK_SIZE):
+        batch = loan_batch_from_rows(rows, rates)
+        merge_totals(totals, portfolio_totals(batch, as_of))
+        for loan_type_id in np.unique(batch["loan_type_id"]):
+            mask = batch["loan_type_id"] == loan_type_id
+            type_batch = {field: values[mask] for field, values in batch.items()}
+            merge_totals(by_type.setdefault(int(loan_type_id), {}), portfolio_totals(type_batch, as_of))
+
+    return {
+        "as_of": as_of.isoformat(),
+        "summary": summarise_portfolio(totals),
+        "by_loan_type": {loan_type_id: summarise_portfolio(t) for loan_type_id, t in by_type.items()}
+    }
+
+
+@app.post("/admin/loans/accrue", tags=["Loans"])
+def run_loan_accrual(
+    as_of: Optional[date] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "admin":
+        raise HTTPException(403, "Only admin can run interest accrual")
+
+    as_of = as_of or date.today()
+    rates = get_loan_rates()
+    started = time.perf_counter()
+    scanned = 0
+    updated = 0
+    total_interest = 0.0
+
+    try:
+        for rows in iter_table_chunks("loan", LOAN_COLUMNS, chunk_size=LOAN_CHUNK_SIZE):
+            payload = accrual_payload(loan_batch_from_rows(rows, rates), as_of)
+            scanned += len(rows)
+
+            if payload["p_ids"]:
+                accrued = supabase.rpc("accrue_loans", payload).execute().data
+                updated += accrued["loans_accrued"]
+                total_interest += float(accrued["interest_accrued"])
+
+        elapsed = time.perf_counter() - started
+        return {
+            "status": "success",
+            "as_of": as_of.isoformat(),
+            "loans_scanned": scanned,
+            "loans_accrued": updated,
+            "interest_accrued": round(total_interest, 2),
+            "elapsed_seconds": round(elapsed, 3),
+            "loans_per_second": round(scanned / elapsed, 1) if elapsed else None
+        }
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(500, detail={
+            "error": "loan_accrual_failed",
+            "message": str(e)
+        })
+
+@app.post("/admin/postings/run", tags=["Postings"])
+def run_batch_postings(
+    request: PostingRunRequest,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "admin":
+        raise HTTPException(403, "Only admin can run batch postings")
+
+    try:
+        return run_postings(
+            run_date=request.run_date,
+            annual_rate=request.annual_interest_rate,
+            monthly_fee=request.monthly_fee,
+            fee_waiver_balance=request.fee_waiver_balance,
+            chunk_size=request.chunk_size
+        )
+    except Exception as e:
+        raise HTTPException(500, detail={
+            "error": "posting_run_failed",
+            "run_date": request.run_date.isoformat(),
+            "message": str(e)
+        })
+
+
+@app.get("/admin/postings/{run_date}", tags=["Postings"])
+def get_batch_posting_run(
+    run_date: date,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "admin":
+        raise HTTPException(403, "Only admin can view batch postings")
+
+    run = get_run(run_date)
+    if not run:
+        raise HTTPException(404, "Posting run not found")
+    return run
+
+def analytics_range(start_date: Optional[date], end_date: Optional[date]):
+    end_date = end_date or date.today()
+    start_date = start_date or end_date - timedelta(days=ANALYTICS_DEFAULT_DAYS - 1)
+    if start_date > end_date:
+        raise HTTPException(400, "start_date must not be after end_date")
+    return start_date, end_date
+
+
+@app.post("/admin/analytics/refresh", tags=["Analytics"])
+def refresh_analytics(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(403, "Only admin can refresh analytics")
+
+    try:
+        return refresh_rollups()
+    except Exception as e:
+        raise HTTPException(500, detail={
+            "error": "rollup_refresh_failed",
+            "message": str(e)
+        })
+
+
+@app.post("/admin/transactions/archive", tags=["Archive"])
+def run_transaction_archive(
+    before: Optional[date] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "admin":
+        raise HTTPException(403, "Only admin can archive transactions")
+    if not archive_configured():
+        raise HTTPException(409, detail={
+            "error": "archive_not_configured",
+            "message": "Set ARCHIVE_DIR to an absolute path on a shared, persistent volume"
+        })
+
+    try:
+        return archive_transactions(before)
+    except Exception as e:
+        raise HTTPException(500, detail={
+            "error": "archive_failed",
+            "message": str(e)
+        })
+
+
+@app.get("/admin/transactions/archive", tags=["Archive"])
+def get_transaction_archive(current_user: dict = Depends(get_current_user)):
+    if current_user["role"] != "admin":
+        raise HTTPException(403, "Only admin can view the archive")
+
+    return load_manifest()
+
+
+@app.get("/admin/analytics/daily", tags=["Analytics"])
+def get_daily_analytics(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "admin":
+        raise HTTPException(403, "Only admin can view analytics")
+
+    start_date, end_date = analytics_range(start_date, end_date)
+    days = fetch_rollups(BANK_ROLLUP, start_date, end_date)
+    return {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "watermark": get_watermark(),
+        "days": days
+    }
+
+
+@app.get("/admin/analytics/top-accounts", tags=["Analytics"])
+def get_top_accounts(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    metric: str = "volume",
+    limit: int = Query(10, gt=0, le=100),
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "admin":
+        raise HTTPException(403, "Only admin can view analytics")
+
+    allowed = ["volume", "transaction_count"] + [f"{m}_{f}" for m in ACCOUNT_METRICS for f in ("total", "count")]
+    if metric not in allowed:
+        raise HTTPException(400, detail={"error": "invalid_metric", "allowed": allowed})
+
+    start_date, end_date = analytics_range(start_date, end_date)
+    return {
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "metric": metric,
+        "accounts": top_accounts(start_date, end_date, metric, limit)
+    }
+
+
+@app.get("/admin/analytics/accounts/{account_id}/daily", tags=["Analytics"])
+def get_account_daily_analytics(
+    account_id: int,
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "admin":
+        raise HTTPException(403, "Only admin can view analytics")
+
+    start_date, end_date = analytics_range(start_date, end_date)
+    return {
+        "account_id": account_id,
+        "start_date": start_date.isoformat(),
+        "end_date": end_date.isoformat(),
+        "days": fetch_rollups(ACCOUNT_ROLLUP, start_date, end_date, account_id=account_id)
+    }
+
 @app.put("/cards/toggle-block")
 async def toggle_card_block(
     is_blocked: bool = Body(..., embed=True),
@@ -414,6 +757,8 @@ async def toggle_card_block(
 
 @app.get("/accounts/statement")
 async def generate_statement(
+    start_date: Optional[date] = None,
+    end_date: Optional[date] = None,
     current_user: dict = Depends(get_current_user)
 ):
     try:
@@ -433,15 +778,11 @@ async def generate_statement(
         balance = account_response.data[0]["balance"]
 
  
-        transactions = supabase.table("transaction") \
-            .select("*") \
-            .or_(f"from_account.eq.{account_id},to_account.eq.{account_id}") \
-            .order("created_at", desc=True) \
-            .execute()
+        transactions = await asyncio.to_thread(fetch_account_transactions, account_id, start_date, end_date)
 
 
         formatted_transactions = []
-        for t in transactions.data:
+        for t in transactions:
             formatted_transactions.append({
                 "id": t["id"],
                 "date": t["created_at"],
@@ -452,15 +793,15 @@ async def generate_statement(
             })
 
 
-        first_date = transactions.data[-1]["created_at"] if transactions.data else "N/A"
-        last_date = transactions.data[0]["created_at"] if transactions.data else "N/A"
+        first_date = transactions[-1]["created_at"] if transactions else "N/A"
+        last_date = transactions[0]["created_at"] if transactions else "N/A"
 
         return {
             "account_id": account_id,
             "customer_id": current_user["linked_customer_id"],
-            "period": "All transactions", 
+            "period": statement_period(start_date, end_date), 
             "current_balance": balance,
-            "transaction_count": len(transactions.data),
+            "transaction_count": len(transactions),
             "transactions": formatted_transactions
         }
 
@@ -472,13 +813,26 @@ async def generate_statement(
             detail=f"Error generating statement: {str(e)}"
         )
 
+@app.on_event("startup")
+async def start_health_monitor():
+    health_monitor.start()
+
+@app.on_event("shutdown")
+async def stop_health_monitor():
+    await health_monitor.stop()
+
+@app.get("/health/live")
+async def liveness_check():
+    return {"status": "alive"}
+
+@app.get("/health/ready")
 @app.get("/health")
-async def health_check():
-    try:
-        supabase.table("account").select("id").limit(1).execute()
-        return {"status": "healthy"}
-    except Exception as e:
-        return {"status": "error", "detail": str(e)}
+async def readiness_check():
+    ready, report = health_monitor.readiness()
+    return JSONResponse(
+        status_code=status.HTTP_200_OK if ready else status.HTTP_503_SERVICE_UNAVAILABLE,
+        content=report
+    )
     
 
 
@@ -770,3 +1124,33 @@ async def get_customers(current_user: dict = Depends(get_current_user)):
     
     customers = supabase.table("customer").select("*").execute()
     return customers.data
+
+
+@app.get("/admin/exports/{table}")
+def export_table_stream(
+    table: str,
+    format: str = "ndjson",
+    chunk_size: int = Query(EXPORT_CHUNK_SIZE, gt=0, le=MAX_ROWS),
+    resume_token: Optional[str] = None,
+    after: Optional[int] = None,
+    current_user: dict = Depends(get_current_user)
+):
+    if current_user["role"] != "admin":
+        raise HTTPException(403, "Only admin can export tables")
+
+    if table not in EXPORT_TABLES:
+        raise HTTPException(404, detail={"error": "unknown_table", "allowed": list(EXPORT_TABLES)})
+    if format not in MEDIA_TYPES:
+        raise HTTPException(400, detail={"error": "invalid_format", "allowed": list(MEDIA_TYPES)})
+
+    if resume_token:
+        try:
+            after = decode_resume_token(table, resume_token)
+        except ValueError as e:
+            raise HTTPException(400, detail={"error": "invalid_resume_token", "message": str(e)})
+
+    return StreamingResponse(
+        export_table(table, format, chunk_size=chunk_size, after=after),
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{table}.{format}"'}
+    )
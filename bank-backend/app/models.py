@@ -17,6 +17,7 @@ class Transaction(BaseModel):
 class LoanApplication(BaseModel):
     account_id: int
     loan_type_id: int
+    amount: Optional[float] = Field(None, gt=0, description="Loan principal")
     amount_paid: float = 0.0
     due_date: date
 
@@ -67,3 +68,10 @@ class AdminAccountStatementResponse(BaseModel):
     current_balance: float
     transaction_count: int
     transactions: list
+
+class PostingRunRequest(BaseModel):
+    run_date: date = Field(..., description="One run per date; resuming a run reuses its stored rate and fee")
+    annual_interest_rate: float = Field(0.0, ge=0, description="Annual savings interest rate in percent")
+    monthly_fee: float = Field(0.0, ge=0, description="Fee charged on the first day of the month")
+    fee_waiver_balance: float = Field(0.0, ge=0, description="Balances at or above this are not charged the fee")
+    chunk_size: int = Field(1000, gt=0, le=1000, description="Capped by the PostgREST max-rows limit")
@@ -0,0 +1,92 @@
+import numpy as np
+import time
+from datetime import date, datetime
+from app.database import supabase, iter_table_chunks
+
+ACCOUNT_COLUMNS = "id, balance"
+RUNS_TABLE = "posting_run"
+
+
+def compute_postings(balances, annual_rate: float, monthly_fee: float, fee_waiver_balance: float, charge_fee: bool):
+    interest = np.where(balances > 0, balances * annual_rate / 100 / 365, 0.0).round(2)
+    credited = balances + interest
+    if charge_fee and monthly_fee > 0:
+        fees = np.where(credited < fee_waiver_balance, np.minimum(monthly_fee, np.maximum(credited, 0.0)), 0.0).round(2)
+    else:
+        fees = np.zeros_like(balances)
+    return interest, fees
+
+
+def get_run(run_date: date):
+    run = supabase.table(RUNS_TABLE).select("*").eq("run_date", run_date.isoformat()).execute()
+    return run.data[0] if run.data else None
+
+
+def _start_run(run_date: date, annual_rate: float, monthly_fee: float, fee_waiver_balance: float):
+    # parameters are fixed when a run is first created; resuming always reuses them
+    supabase.table(RUNS_TABLE).upsert({
+        "run_date": run_date.isoformat(),
+        "annual_interest_rate": annual_rate,
+        "monthly_fee": monthly_fee,
+        "fee_waiver_balance": fee_waiver_balance,
+        "status": "running",
+        "last_account_id": None,
+        "accounts_processed": 0,
+        "interest_posted": 0,
+        "fees_posted": 0,
+        "updated_at": datetime.now().isoformat()
+    }, on_conflict="run_date", ignore_duplicates=True).execute()
+    return get_run(run_date)
+
+
+def post_chunk(run, rows):
+    run_date = date.fromisoformat(str(run["run_date"]))
+    balances = np.array([float(r["balance"] or 0.0) for r in rows])
+    interest, fees = compute_postings(
+        balances,
+        float(run["annual_interest_rate"]),
+        float(run["monthly_fee"]),
+        float(run["fee_waiver_balance"]),
+        run_date.day == 1
+    )
+    changed = (interest > 0) | (fees > 0)
+
+    # balances, transaction rows and the checkpoint move together in one database transaction
+    return supabase.rpc("post_account_chunk", {
+        "p_run_date": run_date.isoformat(),
+        "p_last_account_id": rows[-1]["id"],
+        "p_account_ids": [r["id"] for r, c in zip(rows, changed) if c],
+        "p_interest": interest[changed].tolist(),
+        "p_fees": fees[changed].tolist(),
+        "p_created_at": datetime.now().isoformat()
+    }).execute().data
+
+
+def run_postings(run_date: date, annual_rate: float, monthly_fee: float = 0.0, fee_waiver_balance: float = 0.0, chunk_size: int = 1000):
+    run = get_run(run_date)
+    if run and run["status"] == "completed":
+        return {**run, "status": "already_completed"}
+
+    resumed = run is not None
+    run = run or _start_run(run_date, annual_rate, monthly_fee, fee_waiver_balance)
+    scanned = 0
+    started = time.perf_counter()
+
+    for rows in iter_table_chunks("account", ACCOUNT_COLUMNS, chunk_size=chunk_size, after=run["last_account_id"]):
+        post_chunk(run, rows)
+        scanned += len(rows)
+
+    supabase.table(RUNS_TABLE).update({
+        "status": "completed",
+        "updated_at": datetime.now().isoformat()
+    }).eq("run_date", run_date.isoformat()).execute()
+    run = get_run(run_date)
+    elapsed = time.perf_counter() - started
+
+    return {
+        **run,
+        "resumed": resumed,
+        "accounts_scanned": scanned,
+        "elapsed_seconds": round(elapsed, 3),
+        "accounts_per_second": round(scanned / elapsed, 1) if elapsed else None
+    }
@@ -0,0 +1,227 @@
+import os
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from app.database import iter_table_chunks
+
+WINDOWS = (("1m", 60), ("1h", 3600), ("24h", 86400))
+HISTORY_SECONDS = WINDOWS[-1][1]
+
+INITIAL_CAPACITY = 8
+RELEASED = -1  # receiver marker for a reservation whose payment failed
+MAX_EVENTS_PER_ACCOUNT = int(os.environ.get("RISK_MAX_EVENTS_PER_ACCOUNT", 512))
+MAX_TRACKED_ACCOUNTS = int(os.environ.get("RISK_MAX_TRACKED_ACCOUNTS", 100000))
+
+
+def _limit(name, flag, block):
+    value = os.environ.get(name)
+    if value:
+        flag, block = (float(v) for v in value.split(","))
+    return flag, block
+
+
+# (window, metric) -> (flag threshold, block threshold); "RISK_LIMIT_1M_COUNT=5,10" overrides
+RISK_LIMITS = {
+    ("1m", "count"): _limit("RISK_LIMIT_1M_COUNT", 5, 10),
+    ("1h", "sum"): _limit("RISK_LIMIT_1H_SUM", 10000, 50000),
+    ("1h", "distinct_receivers"): _limit("RISK_LIMIT_1H_DISTINCT_RECEIVERS", 5, 10),
+    ("24h", "count"): _limit("RISK_LIMIT_24H_COUNT", 50, 200),
+    ("24h", "sum"): _limit("RISK_LIMIT_24H_SUM", 25000, 100000),
+}
+
+
+class _AccountRing:
+    __slots__ = ("times", "amounts", "receivers", "head", "tail", "starts", "sums", "distinct", "released")
+
+    def __init__(self):
+        self.times = array("d", bytes(8 * INITIAL_CAPACITY))
+        self.amounts = array("d", bytes(8 * INITIAL_CAPACITY))
+        self.receivers = array("q", bytes(8 * INITIAL_CAPACITY))
+        self.head = 0
+        self.tail = 0
+        self.starts = [0] * len(WINDOWS)
+        self.sums = [0.0] * len(WINDOWS)
+        self.distinct = [{} for _ in WINDOWS]
+        self.released = [0] * len(WINDOWS)
+
+    def _forget(self, w, i):
+        self.sums[w] -= self.amounts[i]
+        receiver = self.receivers[i]
+        remaining = self.distinct[w][receiver] - 1
+        if remaining:
+            self.distinct[w][receiver] = remaining
+        else:
+            del self.distinct[w][receiver]
+
+    def _drop(self, w, seq):
+        i = seq % len(self.times)
+        if self.receivers[i] == RELEASED:
+            self.released[w] -= 1
+        else:
+            self._forget(w, i)
+        self.starts[w] = seq + 1
+        if self.starts[w] == self.tail:
+            self.sums[w] = 0.0
+
+    def expire(self, now):
+        for w, (_, seconds) in enumerate(WINDOWS):
+            horizon = now - seconds
+            while self.starts[w] < self.tail and self.times[self.starts[w] % len(self.times)] <= horizon:
+                self._drop(w, self.starts[w])
+        self.head = self.starts[-1]
+
+    def _grow(self):
+        size = len(self.times)
+        new_size = min(size * 2, MAX_EVENTS_PER_ACCOUNT)
+        for name in ("times", "amounts", "receivers"):
+            old = getattr(self, name)
+            new = array(old.typecode, bytes(8 * new_size))
+            for seq in range(self.head, self.tail):
+                new[seq % new_size] = old[seq % size]
+            setattr(self, name, new)
+
+    def add(self, timestamp, amount, receiver):
+        if self.tail - self.head == len(self.times):
+            if len(self.times) < MAX_EVENTS_PER_ACCOUNT:
+                self._grow()
+            else:
+                for w in range(len(WINDOWS)):
+                    if self.starts[w] == self.head:
+                        self._drop(w, self.head)
+                self.head += 1
+
+        i = self.tail % len(self.times)
+        self.times[i] = timestamp
+        self.amounts[i] = amount
+        self.receivers[i] = receiver
+        self.tail += 1
+        for w in range(len(WINDOWS)):
+            self.sums[w] += amount
+            self.distinct[w][receiver] = self.distinct[w].get(receiver, 0) + 1
+
+    def release(self, seq):
+        if seq < self.head or seq >= self.tail:
+            return
+        i = seq % len(self.times)
+        if self.receivers[i] == RELEASED:
+            return
+        for w in range(len(WINDOWS)):
+            if self.starts[w] <= seq:
+                self._forget(w, i)
+                self.released[w] += 1
+        self.amounts[i] = 0.0
+        self.receivers[i] = RELEASED
+
+    def window(self, w, amount=0.0, receiver=None):
+        distinct = self.distinct[w]
+        return {
+            "count": self.tail - self.starts[w] - self.released[w] + (receiver is not None),
+            "sum": round(self.sums[w] + amount, 2),
+            "distinct_receivers": len(distinct) + (receiver is not None and receiver not in distinct),
+        }
+
+
+_EMPTY_RING = _AccountRing()
+
+
+class VelocityTracker:
+    def __init__(self):
+        self._accounts = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _ring(self, account_id, create=False):
+        ring = self._accounts.get(account_id)
+        if ring is None and create:
+            ring = self._accounts[account_id] = _AccountRing()
+            if len(self._accounts) > MAX_TRACKED_ACCOUNTS:
+                self._accounts.popitem(last=False)
+        elif ring is not None:
+            self._accounts.move_to_end(account_id)
+        return ring
+
+    def record(self, account_id, amount, receiver, timestamp=None):
+        timestamp = timestamp or time.time()
+        with self._lock:
+            ring = self._ring(account_id, create=True)
+            ring.expire(max(timestamp, ring.times[(ring.tail - 1) % len(ring.times)] if ring.tail else timestamp))
+            ring.add(timestamp, float(amount), int(receiver))
+
+    def _snapshot(self, account_id, amount=0.0, receiver=None, now=None):
+        ring = self._ring(account_id)
+        if ring is None:
+            ring = _EMPTY_RING
+        else:
+            ring.expire(now)
+            if ring.head == ring.tail:
+                del self._accounts[account_id]
+        return {name: ring.window(w, amount, receiver) for w, (name, _) in enumerate(WINDOWS)}
+
+    def snapshot(self, account_id):
+        with self._lock:
+            return self._snapshot(account_id, now=time.time())
+
+    def reserve(self, account_id, amount, receiver):
+        # scoring and recording share one critical section, so a concurrent burst
+        # sees each other's reservations instead of all passing the same check
+        amount, receiver = float(amount), int(receiver)
+        now = time.time()
+        with self._lock:
+            risk = _score(self._snapshot(account_id, amount, receiver, now))
+            risk["reservation"] = None
+            if risk["action"] != "block":
+                ring = self._ring(account_id, create=True)
+                ring.add(now, amount, receiver)
+                risk["reservation"] = (ring, ring.tail - 1)
+            return risk
+
+    def release(self, reservation):
+        if reservation is None:
+            return
+        ring, seq = reservation
+        with self._lock:
+            ring.release(seq)
+
+    def tracked_accounts(self):
+        return len(self._accounts)
+
+
+def _score(windows):
+    action = "allow"
+    reasons = []
+    for (window, metric), (flag, block) in RISK_LIMITS.items():
+        value = windows[window][metric]
+        if value > block:
+            action, limit = "block", block
+        elif value > flag:
+            action, limit = "block" if action == "block" else "flag", flag
+        else:
+            continue
+        reasons.append({"window": window, "metric": metric, "value": value, "limit": limit})
+    return {"action": action, "reasons": reasons, "windows": windows}
+
+
+def _timestamp(value):
+    # handlers write created_at as naive local wall-clock time (datetime.now()); a
+    # timestamptz column hands it back labelled UTC, so drop the label and read it
+    # as local time again to line up with time.time()
+    return datetime.fromisoformat(str(value).replace("Z", "+00:00")).replace(tzinfo=None).timestamp()
+
+
+def warm_load(tracker: VelocityTracker, chunk_size=1000):
+    since = (datetime.now() - timedelta(seconds=HISTORY_SECONDS)).isoformat()
+    loaded = 0
+    for rows in iter_table_chunks(
+        "transaction",
+        "id, from_account, to_account, amount, executed_by, created_at",
+        chunk_size=chunk_size,
+        filters=(("gte", "created_at", since), ("neq", "from_account", 0), ("neq", "executed_by", 0))
+    ):
+        for t in rows:
+            tracker.record(t["from_account"], t["amount"], t["to_account"], _timestamp(t["created_at"]))
+        loaded += len(rows)
+    return loaded
+
+
+velocity = VelocityTracker()
@@ -0,0 +1,75 @@
+import os
+import threading
+import time
+from datetime import date, datetime
+from app.database import supabase
+
+WATERMARK_NAME = "transaction_daily"
+ACCOUNT_ROLLUP = "daily_account_rollup"
+BANK_ROLLUP = "daily_bank_rollup"
+PAGE_SIZE = 1000
+ROLLUP_LAG_SECONDS = int(os.environ.get("ROLLUP_LAG_SECONDS", 300))
+ROLLUP_BATCH_SIZE = int(os.environ.get("ROLLUP_BATCH_SIZE", 5000))
+
+ACCOUNT_METRICS = ("deposit", "withdraw", "transfer_in", "transfer_out")
+
+_refresh_lock = threading.Lock()
+
+
+def get_watermark():
+    watermark = supabase.table("rollup_watermark").select("*").eq("name", WATERMARK_NAME).execute()
+    return watermark.data[0] if watermark.data else {"name": WATERMARK_NAME, "last_id": 0, "last_created_at": None}
+
+
+def refresh_rollups(lag_seconds=ROLLUP_LAG_SECONDS, batch_size=ROLLUP_BATCH_SIZE):
+    if not _refresh_lock.acquire(blocking=False):
+        return {"status": "already_running", "watermark": get_watermark()}
+
+    try:
+        started = time.perf_counter()
+        processed = 0
+        while True:
+            batch = supabase.rpc("refresh_transaction_rollups", {
+                "p_lag_seconds": lag_seconds,
+                "p_batch_size": batch_size,
+                "p_now": datetime.now().isoformat()
+            }).execute().data
+            processed += batch["transactions_processed"]
+            if batch["transactions_processed"] < batch_size:
+                break
+
+        return {
+            "status": "success",
+            "transactions_processed": processed,
+            "watermark": get_watermark(),
+            "elapsed_seconds": round(time.perf_counter() - started, 3)
+        }
+    finally:
+        _refresh_lock.release()
+
+
+def fetch_rollups(table, start: date, end: date, account_id=None):
+    rows = []
+    offset = 0
+    while True:
+        query = supabase.table(table) \
+            .select("*") \
+            .gte("day", start.isoformat()) \
+            .lte("day", end.isoformat())
+        if account_id is not None:
+            query = query.eq("account_id", account_id)
+        page = query.order("day").range(offset, offset + PAGE_SIZE - 1).execute()
+        rows.extend(page.data)
+        if len(page.data) < PAGE_SIZE:
+            return rows
+        offset += PAGE_SIZE
+
+
+def top_accounts(start: date, end: date, metric: str, limit: int):
+    ranked = supabase.rpc("rollup_top_accounts", {
+        "p_start": start.isoformat(),
+        "p_end": end.isoformat(),
+        "p_metric": metric,
+        "p_limit": limit
+    }).execute().data
+    return [{field: round(v, 2) if isinstance(v, float) else v for field, v in a.items()} for a in ranked]
@@ -0,0 +1,74 @@
+import os
+import threading
+from collections import OrderedDict
+
+MAX_TRACKED_KEYS = int(os.environ.get("SINGLEFLIGHT_MAX_TRACKED_KEYS", 10000))
+
+
+class _Call:
+    __slots__ = ("done", "result", "error", "callers")
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.callers = 1
+
+
+class SingleFlight:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self._stats = OrderedDict()
+
+    def _key_stats(self, key):
+        stats = self._stats.get(key)
+        if stats is None:
+            stats = self._stats[key] = {"calls": 0, "backend_calls": 0, "coalesced": 0, "in_flight": 0, "max_concurrency": 0}
+            if len(self._stats) > MAX_TRACKED_KEYS:
+                self._stats.popitem(last=False)
+        else:
+            self._stats.move_to_end(key)
+        return stats
+
+    def do(self, key, fn):
+        with self._lock:
+            stats = self._key_stats(key)
+            stats["calls"] += 1
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = _Call()
+                stats["backend_calls"] += 1
+                leader = True
+            else:
+                call.callers += 1
+                stats["coalesced"] += 1
+                leader = False
+            stats["in_flight"] = call.callers
+            stats["max_concurrency"] = max(stats["max_concurrency"], call.callers)
+
+        if not leader:
+            call.done.wait()
+        else:
+            try:
+                call.result = fn()
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._calls[key]
+                    self._key_stats(key)["in_flight"] = 0
+                call.done.set()
+
+        if call.error is not None:
+            raise call.error
+        return call.result
+
+    def stats(self, key=None):
+        with self._lock:
+            if key is not None:
+                return dict(self._stats.get(key) or {})
+            return {str(k): dict(v) for k, v in self._stats.items()}
+
+
+read_flight = SingleFlight()
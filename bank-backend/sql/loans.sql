@@ -0,0 +1,34 @@
+-- Loan engine columns and the bulk accrual writer used by POST /admin/loans/accrue.
+
+alter table loan add column if not exists amount numeric;
+alter table loan add column if not exists accrued_interest numeric not null default 0;
+alter table loan add column if not exists last_accrued_on date;
+
+-- Adds each loan's interest delta and stamps the accrual date in one statement.
+-- p_from is the last_accrued_on each delta was computed from; a loan whose
+-- last_accrued_on has moved since (a retried chunk, or an overlapping run with a
+-- different p_as_of) is skipped rather than charged for the same days twice.
+drop function if exists accrue_loans(date, bigint[], numeric[]);
+create or replace function accrue_loans(p_as_of date, p_ids bigint[], p_from date[], p_interest numeric[])
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_loans integer;
+    v_interest numeric;
+begin
+    with accrued as (
+        update loan l
+        set accrued_interest = coalesce(l.accrued_interest, 0) + u.interest,
+            last_accrued_on = p_as_of
+        from unnest(p_ids, p_from, p_interest) as u(id, accrued_from, interest)
+        where l.id = u.id
+          and l.last_accrued_on is not distinct from u.accrued_from
+          and (l.last_accrued_on is null or l.last_accrued_on < p_as_of)
+        returning u.interest
+    )
+    select count(*), coalesce(sum(interest), 0) into v_loans, v_interest from accrued;
+
+    return jsonb_build_object('loans_accrued', v_loans, 'interest_accrued', v_interest);
+end;
+$$;
@@ -0,0 +1,84 @@
+-- Nightly interest and fee posting runs (POST /admin/postings/run).
+
+create table if not exists posting_run (
+    run_date date primary key,
+    annual_interest_rate numeric not null,
+    monthly_fee numeric not null default 0,
+    fee_waiver_balance numeric not null default 0,
+    status text not null,
+    last_account_id bigint,
+    accounts_processed integer not null default 0,
+    interest_posted numeric not null default 0,
+    fees_posted numeric not null default 0,
+    updated_at timestamp
+);
+
+-- Postings carry the run they belong to; customer-supplied descriptions play no part in idempotency.
+alter table transaction add column if not exists posting_run date;
+create index if not exists transaction_posting_run_idx on transaction (posting_run) where posting_run is not null;
+
+-- Applies one chunk of a run atomically: relative balance updates, the matching
+-- transaction rows and the checkpoint. Accounts that already have a posting for
+-- p_run_date on the bank side (account 0) are skipped, so a replayed chunk is a no-op.
+-- p_created_at comes from the app, so posting rows use the same clock as every
+-- handler-written transaction instead of the database's now().
+drop function if exists post_account_chunk(date, bigint, bigint[], numeric[], numeric[]);
+create or replace function post_account_chunk(
+    p_run_date date,
+    p_last_account_id bigint,
+    p_account_ids bigint[],
+    p_interest numeric[],
+    p_fees numeric[],
+    p_created_at timestamp
+)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_accounts integer;
+    v_interest numeric;
+    v_fees numeric;
+begin
+    perform 1 from posting_run where run_date = p_run_date for update;
+
+    with pending as (
+        select u.account_id, u.interest, u.fee
+        from unnest(p_account_ids, p_interest, p_fees) as u(account_id, interest, fee)
+        where not exists (
+            select 1 from transaction t
+            where t.posting_run = p_run_date
+              and ((t.from_account = 0 and t.to_account = u.account_id)
+                or (t.to_account = 0 and t.from_account = u.account_id))
+        )
+    ),
+    updated as (
+        update account a
+        set balance = a.balance + p.interest - p.fee
+        from pending p
+        where a.id = p.account_id
+        returning p.account_id, p.interest, p.fee
+    ),
+    inserted as (
+        insert into transaction (from_account, to_account, amount, description, executed_by, created_at, posting_run)
+        select 0, account_id, interest, 'Interest posting ' || p_run_date, 0, p_created_at, p_run_date
+        from updated where interest > 0
+        union all
+        select account_id, 0, fee, 'Monthly fee ' || p_run_date, 0, p_created_at, p_run_date
+        from updated where fee > 0
+        returning 1
+    )
+    select count(*), coalesce(sum(interest), 0), coalesce(sum(fee), 0)
+    into v_accounts, v_interest, v_fees
+    from updated;
+
+    update posting_run
+    set last_account_id = p_last_account_id,
+        accounts_processed = accounts_processed + v_accounts,
+        interest_posted = interest_posted + v_interest,
+        fees_posted = fees_posted + v_fees,
+        updated_at = p_created_at
+    where run_date = p_run_date;
+
+    return jsonb_build_object('accounts_posted', v_accounts, 'interest_posted', v_interest, 'fees_posted', v_fees);
+end;
+$$;
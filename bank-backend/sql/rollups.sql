@@ -0,0 +1,186 @@
+-- Daily transaction rollups behind the /admin/analytics endpoints.
+
+create table if not exists rollup_watermark (
+    name text primary key,
+    last_created_at timestamptz not null default '-infinity',
+    last_id bigint not null default 0,
+    updated_at timestamptz
+);
+
+create table if not exists daily_account_rollup (
+    day date not null,
+    account_id bigint not null,
+    transaction_count integer not null default 0,
+    volume numeric not null default 0,
+    deposit_count integer not null default 0,
+    deposit_total numeric not null default 0,
+    withdraw_count integer not null default 0,
+    withdraw_total numeric not null default 0,
+    transfer_in_count integer not null default 0,
+    transfer_in_total numeric not null default 0,
+    transfer_out_count integer not null default 0,
+    transfer_out_total numeric not null default 0,
+    primary key (day, account_id)
+);
+
+create table if not exists daily_bank_rollup (
+    day date primary key,
+    transaction_count integer not null default 0,
+    volume numeric not null default 0,
+    deposit_count integer not null default 0,
+    deposit_total numeric not null default 0,
+    withdraw_count integer not null default 0,
+    withdraw_total numeric not null default 0,
+    transfer_count integer not null default 0,
+    transfer_total numeric not null default 0
+);
+
+create index if not exists transaction_created_at_id_idx on transaction (created_at, id);
+
+-- Folds the next batch of transactions past the (created_at, id) watermark into
+-- the rollups and advances the watermark, all in one database transaction.
+-- Rows younger than p_lag_seconds are left for a later refresh so that
+-- transactions still committing when the batch is read are not skipped. p_now is
+-- the app clock, which is what handlers write into created_at.
+drop function if exists refresh_transaction_rollups(integer, integer);
+create or replace function refresh_transaction_rollups(p_lag_seconds integer, p_batch_size integer, p_now timestamp)
+returns jsonb
+language plpgsql
+as $$
+declare
+    v_watermark rollup_watermark%rowtype;
+    v_count integer;
+    v_last_id bigint;
+    v_last_created_at timestamptz;
+begin
+    insert into rollup_watermark (name) values ('transaction_daily') on conflict (name) do nothing;
+    select * into v_watermark from rollup_watermark where name = 'transaction_daily' for update;
+
+    with batch as (
+        select id, from_account, to_account, amount, created_at, created_at::date as day
+        from transaction
+        where (created_at, id) > (v_watermark.last_created_at, v_watermark.last_id)
+          and created_at <= p_now - make_interval(secs => p_lag_seconds)
+        order by created_at, id
+        limit p_batch_size
+    ),
+    legs as (
+        select day, to_account as account_id, 'deposit' as kind, amount from batch where from_account = 0
+        union all
+        select day, from_account, 'withdraw', amount from batch where from_account <> 0 and to_account = 0
+        union all
+        select day, from_account, 'transfer_out', amount from batch where from_account <> 0 and to_account <> 0
+        union all
+        select day, to_account, 'transfer_in', amount from batch where from_account <> 0 and to_account <> 0
+    ),
+    account_upsert as (
+        insert into daily_account_rollup as r (
+            day, account_id, transaction_count, volume,
+            deposit_count, deposit_total, withdraw_count, withdraw_total,
+            transfer_in_count, transfer_in_total, transfer_out_count, transfer_out_total
+        )
+        select day, account_id, count(*), sum(amount),
+            count(*) filter (where kind = 'deposit'), coalesce(sum(amount) filter (where kind = 'deposit'), 0),
+            count(*) filter (where kind = 'withdraw'), coalesce(sum(amount) filter (where kind = 'withdraw'), 0),
+            count(*) filter (where kind = 'transfer_in'), coalesce(sum(amount) filter (where kind = 'transfer_in'), 0),
+            count(*) filter (where kind = 'transfer_out'), coalesce(sum(amount) filter (where kind = 'transfer_out'), 0)
+        from legs
+        group by day, account_id
+        on conflict (day, account_id) do update set
+            transaction_count = r.transaction_count + excluded.transaction_count,
+            volume = r.volume + excluded.volume,
+            deposit_count = r.deposit_count + excluded.deposit_count,
+            deposit_total = r.deposit_total + excluded.deposit_total,
+            withdraw_count = r.withdraw_count + excluded.withdraw_count,
+            withdraw_total = r.withdraw_total + excluded.withdraw_total,
+            transfer_in_count = r.transfer_in_count + excluded.transfer_in_count,
+            transfer_in_total = r.transfer_in_total + excluded.transfer_in_total,
+            transfer_out_count = r.transfer_out_count + excluded.transfer_out_count,
+            transfer_out_total = r.transfer_out_total + excluded.transfer_out_total
+    ),
+    bank_upsert as (
+        insert into daily_bank_rollup as r (
+            day, transaction_count, volume,
+            deposit_count, deposit_total, withdraw_count, withdraw_total, transfer_count, transfer_total
+        )
+        select day, count(*), sum(amount),
+            count(*) filter (where from_account = 0), coalesce(sum(amount) filter (where from_account = 0), 0),
+            count(*) filter (where from_account <> 0 and to_account = 0), coalesce(sum(amount) filter (where from_account <> 0 and to_account = 0), 0),
+            count(*) filter (where from_account <> 0 and to_account <> 0), coalesce(sum(amount) filter (where from_account <> 0 and to_account <> 0), 0)
+        from batch
+        group by day
+        on conflict (day) do update set
+            transaction_count = r.transaction_count + excluded.transaction_count,
+            volume = r.volume + excluded.volume,
+            deposit_count = r.deposit_count + excluded.deposit_count,
+            deposit_total = r.deposit_total + excluded.deposit_total,
+            withdraw_count = r.withdraw_count + excluded.withdraw_count,
+            withdraw_total = r.withdraw_total + excluded.withdraw_total,
+            transfer_count = r.transfer_count + excluded.transfer_count,
+            transfer_total = r.transfer_total + excluded.transfer_total
+    )
+    select count(*),
+        (array_agg(id order by created_at desc, id desc))[1],
+        max(created_at)
+    into v_count, v_last_id, v_last_created_at
+    from batch;
+
+    if v_count > 0 then
+        update rollup_watermark
+        set last_created_at = v_last_created_at, last_id = v_last_id, updated_at = now()
+        where name = 'transaction_daily';
+    end if;
+
+    return jsonb_build_object(
+        'transactions_processed', v_count,
+        'last_created_at', coalesce(v_last_created_at, v_watermark.last_created_at),
+        'last_id', coalesce(v_last_id, v_watermark.last_id)
+    );
+end;
+$$;
+
+-- Ranks accounts by one rollup metric over a day range for GET /admin/analytics/top-accounts.
+create or replace function rollup_top_accounts(p_start date, p_end date, p_metric text, p_limit integer)
+returns table (
+    account_id bigint,
+    transaction_count bigint,
+    volume numeric,
+    deposit_count bigint,
+    deposit_total numeric,
+    withdraw_count bigint,
+    withdraw_total numeric,
+    transfer_in_count bigint,
+    transfer_in_total numeric,
+    transfer_out_count bigint,
+    transfer_out_total numeric
+)
+language sql
+stable
+as $$
+    select *
+    from (
+        select r.account_id,
+            sum(r.transaction_count), sum(r.volume),
+            sum(r.deposit_count), sum(r.deposit_total),
+            sum(r.withdraw_count), sum(r.withdraw_total),
+            sum(r.transfer_in_count), sum(r.transfer_in_total),
+            sum(r.transfer_out_count), sum(r.transfer_out_total)
+        from daily_account_rollup r
+        where r.day between p_start and p_end
+        group by r.account_id
+    ) as totals (account_id, transaction_count, volume, deposit_count, deposit_total, withdraw_count, withdraw_total,
+                 transfer_in_count, transfer_in_total, transfer_out_count, transfer_out_total)
+    order by case p_metric
+        when 'volume' then totals.volume
+        when 'transaction_count' then totals.transaction_count
+        when 'deposit_count' then totals.deposit_count
+        when 'deposit_total' then totals.deposit_total
+        when 'withdraw_count' then totals.withdraw_count
+        when 'withdraw_total' then totals.withdraw_total
+        when 'transfer_in_count' then totals.transfer_in_count
+        when 'transfer_in_total' then totals.transfer_in_total
+        when 'transfer_out_count' then totals.transfer_out_count
+        when 'transfer_out_total' then totals.transfer_out_total
+    end desc, totals.account_id
+    limit p_limit
+$$;
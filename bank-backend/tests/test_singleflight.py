@@ -0,0 +1,93 @@
+import threading
+import time
+
+import pytest
+
+from app.singleflight import SingleFlight
+
+CALLERS = 20
+
+
+def _wait_for(condition, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out waiting for callers to join the flight")
+        time.sleep(0.001)
+
+
+def _run_concurrently(flight, key, backend):
+    barrier = threading.Barrier(CALLERS)
+    results = [None] * CALLERS
+    errors = [None] * CALLERS
+
+    def caller(i):
+        barrier.wait()
+        try:
+            results[i] = flight.do(key, backend)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=caller, args=(i,)) for i in range(CALLERS)]
+    for t in threads:
+        t.start()
+    return threads, results, errors
+
+
+def test_concurrent_callers_share_one_backend_call():
+    flight = SingleFlight()
+    release = threading.Event()
+    backend_calls = []
+
+    def backend():
+        backend_calls.append(1)
+        release.wait(5)
+        return {"balance": 100.0}
+
+    threads, results, errors = _run_concurrently(flight, "account_balance:1", backend)
+    _wait_for(lambda: flight.stats("account_balance:1").get("in_flight") == CALLERS)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert len(backend_calls) == 1
+    assert errors == [None] * CALLERS
+    assert all(r is results[0] for r in results)
+    assert flight.stats("account_balance:1") == {
+        "calls": CALLERS,
+        "backend_calls": 1,
+        "coalesced": CALLERS - 1,
+        "in_flight": 0,
+        "max_concurrency": CALLERS
+    }
+
+
+def test_backend_exception_reaches_every_caller():
+    flight = SingleFlight()
+    release = threading.Event()
+    failure = RuntimeError("database unavailable")
+
+    def backend():
+        release.wait(5)
+        raise failure
+
+    threads, results, errors = _run_concurrently(flight, "account_balance:2", backend)
+    _wait_for(lambda: flight.stats("account_balance:2").get("in_flight") == CALLERS)
+    release.set()
+    for t in threads:
+        t.join()
+
+    assert all(e is failure for e in errors)
+    assert results == [None] * CALLERS
+    assert flight.stats("account_balance:2")["backend_calls"] == 1
+
+
+def test_completed_flight_does_not_cache():
+    flight = SingleFlight()
+    calls = []
+
+    assert flight.do("k", lambda: calls.append(1) or len(calls)) == 1
+    assert flight.do("k", lambda: calls.append(1) or len(calls)) == 2
+    with pytest.raises(ValueError):
+        flight.do("k", lambda: (_ for _ in ()).throw(ValueError("boom")))
+    assert flight.stats("k")["backend_calls"] == 3